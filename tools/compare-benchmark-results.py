@@ -36,23 +36,20 @@ $ tools/compare-benchmarks-results.py results_dir_1 results_dir_2 results_dir_3
 """
 
 import argparse
-import csv
+from concurrent import futures
 import dataclasses
+import functools
 import logging
 import os
-import statistics
 import sys
+import warnings
+
+import numpy as np
 
 # Metric names (from benchmark output format).
 _CSV_BENCHMARK_METRICS = ['Pipeline GPU time (ms)', 'Frame CPU time (ms)']
 
 
-@dataclasses.dataclass
-class FrameDatapoint:
-  num_frame: int
-  metrics: list[float]
-
-
 @dataclasses.dataclass
 class AggregatedTestMetric:
   name: str
@@ -64,17 +61,31 @@ class AggregatedTestMetric:
 
 @dataclasses.dataclass
 class TestResults:
-  """A collection of per-frame datapoints."""
-  frame_datapoints: list[FrameDatapoint]
+  """A collection of per-frame datapoints.
 
-  def GetMetric(self, metric_index):
-    data = [frame.metrics[metric_index] for frame in self.frame_datapoints]
-    return AggregatedTestMetric(_CSV_BENCHMARK_METRICS[metric_index], min(data),
-                                statistics.mean(data), statistics.median(data),
-                                max(data))
+  The metrics are stored as an array of shape (N, len(_CSV_BENCHMARK_METRICS)),
+  where row i holds the metrics of frame frame_nums[i].
+  """
+  frame_nums: np.ndarray = dataclasses.field(
+      default_factory=lambda: np.empty(0, dtype=np.int64))
+  metrics: np.ndarray = dataclasses.field(
+      default_factory=lambda: np.empty((0, len(_CSV_BENCHMARK_METRICS))))
+
+  def GetAllMetrics(self):
+    """Aggregate every metric, or return None if there are no datapoints."""
+    if not self.ContainsDatapoints():
+      return None
+    # Reduce all metric columns at once rather than one column at a time.
+    return [
+        AggregatedTestMetric(*values) for values in zip(
+            _CSV_BENCHMARK_METRICS, self.metrics.min(axis=0).tolist(),
+            self.metrics.mean(axis=0).tolist(),
+            np.median(self.metrics, axis=0).tolist(),
+            self.metrics.max(axis=0).tolist())
+    ]
 
   def ContainsDatapoints(self):
-    return self.frame_datapoints
+    return self.frame_nums.size > 0
 
 
 def CollectBenchmarkTestResults(results_dir):
@@ -86,17 +97,20 @@ def CollectBenchmarkTestResults(results_dir):
   Returns:
     A dictionary that maps test case names to the filename containing results.
   """
-  test_cases = dict()
-  for _, _, filenames in os.walk(results_dir):
-    for filename in sorted(filenames):
-      if filename.endswith('.csv'):
-        test_cases[filename[:-4]] = os.path.join(results_dir, filename)
-  return test_cases
+  with os.scandir(results_dir) as it:
+    entries = sorted((e for e in it if e.name.endswith('.csv') and
+                      e.is_file()),
+                     key=lambda e: e.name)
+  return {e.name[:-4]: e.path for e in entries}
 
 
+@functools.lru_cache(maxsize=None)
 def ReadTestResults(result_filename, num_frames_to_ignore):
   """Read test results given a path to a CSV benchmark file.
 
+  Results are cached per (result_filename, num_frames_to_ignore), so each file
+  is only parsed once.
+
   Args:
     result_filename: The path to the CSV output from a benchmark run.
     num_frames_to_ignore: The number N of frames to ignore. The datapoints of
@@ -105,25 +119,27 @@ def ReadTestResults(result_filename, num_frames_to_ignore):
   Returns:
     The parsed test results.
   """
-  frame_datapoints = []
-  with open(result_filename) as f:
-    r = csv.reader(f, delimiter=',')
-    for row in r:
-      if len(row) < 3:
-        logging.error('Invalid result CSV format for file %s', result_filename)
-        return TestResults()
-      frame_num = int(row[0])
-      if frame_num < 0:
-        logging.error('Invalid frame number %s found in CSV file %s', frame_num,
-                      result_filename)
-        return TestResults()
-      if frame_num <= num_frames_to_ignore:
-        continue
-      frame_datapoints.append(
-          FrameDatapoint(frame_num,
-                         [float(row[1]), float(row[2])]))
-
-  return TestResults(frame_datapoints)
+  # Only the first three columns (frame number and metrics) are common to all
+  # benchmarks, any other column is ignored.
+  try:
+    data = np.loadtxt(
+        result_filename,
+        delimiter=',',
+        usecols=(0, 1, 2),
+        dtype=np.float64,
+        ndmin=2)
+  except (ValueError, IndexError):
+    logging.error('Invalid result CSV format for file %s', result_filename)
+    return TestResults()
+
+  frame_nums = data[:, 0]
+  if (frame_nums < 0).any():
+    logging.error('Invalid frame number %s found in CSV file %s',
+                  int(frame_nums.min()), result_filename)
+    return TestResults()
+
+  data = data[frame_nums > num_frames_to_ignore]
+  return TestResults(data[:, 0].astype(np.int64), data[:, 1:3])
 
 
 def GetPercentageDiff(first, second):
@@ -173,28 +189,46 @@ def CompareTestResults(results, names, num_frames_to_ignore):
   base_results = results[0]
   base_name = names[0]
 
+  # Parse all the result files that will be compared concurrently. The parsed
+  # results are cached by ReadTestResults, so the loop below does no file IO.
+  paths = [r[t] for t in base_results for r in results if t in r]
+  with futures.ThreadPoolExecutor() as ex:
+    list(ex.map(lambda p: ReadTestResults(p, num_frames_to_ignore), paths))
+
   for test_name in base_results:
     print('Benchmark %s:' % test_name)
 
+    # Aggregate every results file for this test once, up front.
+    base_metrics = ReadTestResults(base_results[test_name],
+                                   num_frames_to_ignore).GetAllMetrics()
+    other_metrics = []
+    for other_results in results[1:]:
+      # None for missing files and for files without any datapoints.
+      if test_name not in other_results:
+        other_metrics.append(None)
+        continue
+      other_metrics.append(
+          ReadTestResults(other_results[test_name],
+                          num_frames_to_ignore).GetAllMetrics())
+
+    if base_metrics is None:
+      print('\t[%s] No data' % base_name)
+      print('')
+      continue
+
     # For each metric measured, print baseline and comparisons.
-    base_data = ReadTestResults(base_results[test_name], num_frames_to_ignore)
     for m in range(0, len(_CSV_BENCHMARK_METRICS)):
-      PrintMetricResultsBaseline(base_name, base_data.GetMetric(m))
+      PrintMetricResultsBaseline(base_name, base_metrics[m])
 
       # Output the metric values from all other benchmarks results,
       # showing a percentage comparison against the baseline.
-      for i in range(1, len(results)):
-        other_results = results[i]
-        other_name = names[i]
-        if test_name not in other_results:
+      for other_name, other_data in zip(names[1:], other_metrics):
+        if other_data is None:
           print('\t[%s] No data' % other_name)
           continue
 
-        other_data = ReadTestResults(other_results[test_name],
-                                     num_frames_to_ignore)
-        PrintMetricResultsComparison(base_name, other_name,
-                                     base_data.GetMetric(m),
-                                     other_data.GetMetric(m))
+        PrintMetricResultsComparison(base_name, other_name, base_metrics[m],
+                                     other_data[m])
 
     print('')
 
@@ -231,6 +265,13 @@ def main():
 
   args = ProcessArgs()
 
+  # Empty result files are reported as having no data, numpy's warning about
+  # them is redundant.
+  warnings.filterwarnings(
+      'ignore',
+      message='loadtxt: input contained no data',
+      category=UserWarning)
+
   if len(args.results_dirs) < 2:
     logging.error('Not enough benchmark result directories specified, at least '
                   'two required to perform comparisons')
@@ -242,7 +283,8 @@ def main():
       logging.error('Path %s is not a valid directory', d)
       return -1
 
-  results = [CollectBenchmarkTestResults(d) for d in dirs]
+  with futures.ThreadPoolExecutor() as ex:
+    results = list(ex.map(CollectBenchmarkTestResults, dirs))
   names = [os.path.basename(d) for d in dirs]
   return CompareTestResults(results, names, args.ignore_first_N_frames)
 
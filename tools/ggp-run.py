@@ -106,8 +106,9 @@ def main():
   args = parser.parse_args()
 
   sources = ['assets', args.binary]
-  rc = ggp_utils.SyncFilesToInstance(args.ggp_bin, args.instance, sources,
-                                     '/mnt/developer/%s/' % args.app_path)
+  rc = ggp_utils.SyncFilesToInstanceParallel(
+      args.ggp_bin, args.instance, sources,
+      '/mnt/developer/%s/' % args.app_path)
   if rc != 0:
     return rc
 
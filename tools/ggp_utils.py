@@ -14,9 +14,92 @@
 
 """Utilities to interact with a GGP instance using the ggp utility."""
 
+from concurrent import futures
 import logging
 import os
+import shlex
 import subprocess
+import sys
+
+# Marker printed by GgpSession after each command, followed by its exit status.
+_SESSION_STATUS_MARKER = '__GGP_SESSION_STATUS__'
+
+
+class GgpSession:
+  """A persistent shell on a GGP instance.
+
+  Commands run through a session share a single `ggp ssh shell` connection, so
+  the connection setup is only paid once rather than once per command. Use as
+  a context manager:
+
+    with ggp_utils.GgpSession(ggp_bin, instance) as session:
+      rc = session.Run('ls /mnt/developer')
+  """
+
+  def __init__(self, ggp_bin, instance):
+    """Creates a session.
+
+    Args:
+      ggp_bin: Path to the ggp executable.
+      instance: The instance name or ID. Can be none, if only one instance is
+        reserved.
+    """
+    self._cmd = [ggp_bin, 'ssh', 'shell']
+    if instance is not None:
+      self._cmd.extend(['--instance', instance])
+    self._cmd.extend(['--', 'bash', '-s'])
+    self._proc = None
+
+  def __enter__(self):
+    logging.info('$ %s', ' '.join(self._cmd))
+    self._proc = subprocess.Popen(
+        self._cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    try:
+      self._proc.stdin.close()
+    except OSError:
+      # The session already exited, and the pending input cannot be flushed.
+      pass
+    self._proc.wait()
+
+  def _SessionExited(self):
+    """Logs that the session exited, and returns a non-zero return code."""
+    rc = self._proc.wait()
+    logging.error('The ggp shell session exited unexpectedly (code %s)', rc)
+    return rc or 255
+
+  def Run(self, command):
+    """Runs a shell command on the instance.
+
+    The command runs in its own `bash -c` with no stdin, so it cannot change
+    the session state or consume the commands that follow it, and a syntax
+    error in it only results in a non-zero return code. Its stdout is
+    forwarded to the local stdout, and its stderr goes to the local stderr.
+
+    Args:
+      command: The shell command to run.
+
+    Returns:
+      A return code value. 0 means success.
+    """
+    logging.info('[session] $ %s', command)
+    if self._proc.poll() is not None:
+      return self._SessionExited()
+    try:
+      self._proc.stdin.write('bash -c %s < /dev/null\necho "%s $?"\n' %
+                             (shlex.quote(command), _SESSION_STATUS_MARKER))
+      self._proc.stdin.flush()
+    except OSError:
+      return self._SessionExited()
+    for line in self._proc.stdout:
+      output, marker, status = line.partition(_SESSION_STATUS_MARKER)
+      sys.stdout.write(output)
+      if marker:
+        sys.stdout.flush()
+        return int(status)
+    return self._SessionExited()
 
 
 def SyncFilesToInstance(ggp_bin, instance, sources, dst):
@@ -41,6 +124,34 @@ def SyncFilesToInstance(ggp_bin, instance, sources, dst):
   return subprocess.call(cmd)
 
 
+def SyncFilesToInstanceParallel(ggp_bin, instance, sources, dst):
+  """Transfers the given file(s) to the given instance, one sync per source.
+
+  Each source is synchronized by its own `ggp ssh sync` invocation, and up to
+  four invocations run concurrently. This lets small sources (e.g. a binary)
+  be transferred while a large source (e.g. the assets tree) is still being
+  synchronized. Use SyncFilesToInstance if all sources must be transferred by
+  a single invocation.
+
+  Args:
+    ggp_bin: Path to the ggp executable.
+    instance: The instance name or ID. Can be none, if only one instance is
+      reserved.
+    sources: A list of local paths to synchronize.
+    dst: The path of the destination directory on the instance.
+
+  Returns:
+    A return code value. 0 means success.
+  """
+  if len(sources) <= 1:
+    return SyncFilesToInstance(ggp_bin, instance, sources, dst)
+
+  with futures.ThreadPoolExecutor(max_workers=min(4, len(sources))) as ex:
+    rcs = ex.map(lambda source: SyncFilesToInstance(ggp_bin, instance,
+                                                    [source], dst), sources)
+    return next((rc for rc in rcs if rc != 0), 0)
+
+
 def GetFilesFromInstance(ggp_bin, instance, sources, dst):
   """Transfers the given file(s) from the given instance to the local machine.
 
@@ -93,8 +204,13 @@ def RunOnInstance(ggp_bin, instance, app_path, binary, binary_args, ggp_vars):
   return subprocess.call(cmd)
 
 
-def RunOnInstanceHeadless(ggp_bin, instance, app_path, binary, binary_args,
-                          env_vars):
+def RunOnInstanceHeadless(ggp_bin,
+                          instance,
+                          app_path,
+                          binary,
+                          binary_args,
+                          env_vars,
+                          session=None):
   """Runs the given binary on the instance, in headless mode (no endpoint).
 
   This is achieved by SSH-ing into into the instance and running the binary
@@ -108,6 +224,8 @@ def RunOnInstanceHeadless(ggp_bin, instance, app_path, binary, binary_args,
     binary: The binary to execute.
     binary_args: The command-line arguments to pass to the binary.
     env_vars: Environment variables to set when running the binary.
+    session: An optional GgpSession to run the binary through. If none, a new
+      `ggp ssh shell` connection is made.
 
   Returns:
     A return code value. 0 means success.
@@ -115,6 +233,8 @@ def RunOnInstanceHeadless(ggp_bin, instance, app_path, binary, binary_args,
 
   binary_cmd = '%s/%s %s' % (app_path, os.path.basename(binary), binary_args)
   full_ssh_command = ('cd /mnt/developer; %s %s') % (env_vars, binary_cmd)
+  if session is not None:
+    return session.Run(full_ssh_command)
 
   cmd = [
       ggp_bin,
@@ -128,7 +248,7 @@ def RunOnInstanceHeadless(ggp_bin, instance, app_path, binary, binary_args,
   return subprocess.call(cmd)
 
 
-def TerminateProcessOnInstance(ggp_bin, instance, process_name):
+def TerminateProcessOnInstance(ggp_bin, instance, process_name, session=None):
   """Forcefully terminate the given process on the instance.
 
   Args:
@@ -136,12 +256,16 @@ def TerminateProcessOnInstance(ggp_bin, instance, process_name):
     instance: The instance name or ID. Can be none, if only one instance is
       reserved.
     process_name: The name of the process to kill.
+    session: An optional GgpSession to run the command through. If none, a new
+      `ggp ssh shell` connection is made.
 
   Returns:
     A return code value. 0 means success.
   """
 
   ssh_command = 'killall %s || echo "Already killed."' % process_name
+  if session is not None:
+    return session.Run(ssh_command)
 
   cmd = [
       ggp_bin,
@@ -25,10 +25,14 @@ $ tools/run-benchmarks.py tools/benchmark_testcases.csv --out benchmark_results
 """
 
 import argparse
+from concurrent import futures
+import contextlib
 import csv
 import logging
 import os
+import queue
 import sys
+import threading
 import ggp_utils
 
 # Default location for the 'ggp' binary.
@@ -78,9 +82,7 @@ def CollectBenchmarkTestCases(testcases_file):
         logging.warning('Row %s is invalid, it will be skipped', row)
         continue
 
-      test_cases.append(
-          BenchmarkTestCase(row[0].strip(), row[1].strip(), row[2].strip(),
-                            row[3].strip()))
+      test_cases.append(BenchmarkTestCase(*(field.strip() for field in row)))
   return test_cases
 
 
@@ -117,6 +119,22 @@ def ProcessArgs():
       default=20,
       help='Number of frames to run each benchmark for (default: %(default)s).',
   )
+  parser.add_argument(
+      '--jobs',
+      type=int,
+      default=1,
+      help='Number of benchmarks to run concurrently on the instance. Running '
+      'more than one at a time shortens the total run, but concurrent '
+      'benchmarks compete for the GPU and affect each other\'s results '
+      '(default: %(default)s).',
+  )
+  parser.add_argument(
+      '--fail_fast',
+      action='store_true',
+      help='Stop running benchmarks after the first failure. Benchmarks '
+      'already running are allowed to finish, and the results of all the '
+      'completed benchmarks are still retrieved.',
+  )
   parser.add_argument(
       '--out',
       default='benchmark_results',
@@ -133,11 +151,19 @@ def ProcessArgs():
   return args
 
 
+def GetRemoteCsvFilePath(test_case, app_path):
+  """Get the path on the instance where a test case writes its results."""
+  return os.path.join('/mnt/developer', app_path,
+                      test_case.GetCsvOutputFilename())
+
+
 def RunBenchmarkTestCase(test_case, ggp_bin, instance, app_path, env_vars,
-                         num_frames, out_dir):
-  """Run a benchmark test case and retrieve results."""
-  csv_file_path = os.path.join('/mnt/developer', app_path,
-                               test_case.GetCsvOutputFilename())
+                         num_frames, session):
+  """Run a benchmark test case.
+
+  The results are left on the instance, at GetRemoteCsvFilePath().
+  """
+  csv_file_path = GetRemoteCsvFilePath(test_case, app_path)
   stats_file_arg = '--stats-file %s' % csv_file_path
   num_frames_arg = '--frame-count %s' % num_frames
   binary_args = ' '.join(
@@ -146,19 +172,13 @@ def RunBenchmarkTestCase(test_case, ggp_bin, instance, app_path, env_vars,
   logging.info('Running benchmark "%s"', test_case.GetDescriptiveName())
   rc = ggp_utils.RunOnInstanceHeadless(ggp_bin, instance, app_path,
                                        test_case.GetBinaryName(), binary_args,
-                                       env_vars)
+                                       env_vars, session)
 
   if rc != 0:
     return rc
 
-  rc = ggp_utils.TerminateProcessOnInstance(ggp_bin, instance,
-                                            test_case.GetBinaryName())
-
-  if rc != 0:
-    return rc
-
-  return ggp_utils.GetFilesFromInstance(ggp_bin, instance, [csv_file_path],
-                                        out_dir)
+  return ggp_utils.TerminateProcessOnInstance(ggp_bin, instance,
+                                             test_case.GetBinaryName(), session)
 
 
 def main():
@@ -167,6 +187,10 @@ def main():
 
   args = ProcessArgs()
 
+  if args.jobs < 1:
+    logging.error('--jobs must be at least 1.')
+    return -1
+
   test_cases = CollectBenchmarkTestCases(args.testcases_file)
   if not test_cases:
     logging.error('No test cases specified.')
@@ -174,7 +198,7 @@ def main():
 
   # Upload assets and benchmark binaries.
   sources = ['assets']
-  sources.extend(set(['bin/' + tc.GetBinaryName() for tc in test_cases]))
+  sources.extend(sorted({'bin/' + tc.GetBinaryName() for tc in test_cases}))
   rc = ggp_utils.SyncFilesToInstance(args.ggp_bin, args.instance, sources,
                                      '/mnt/developer/%s/' % args.app_path)
   if rc != 0:
@@ -182,17 +206,113 @@ def main():
 
   os.makedirs(args.out, exist_ok=True)
 
-  # Execute each benchmark test case and retrieve CSV result output.
+  # Execute each benchmark test case, in the order of the testcases file.
+  # Benchmarks are terminated by binary name, so a test case is held back while
+  # another test case of the same binary is running, and the next test case in
+  # file order runs instead. Test cases of different binaries run concurrently
+  # (up to --jobs at a time). Each worker runs its benchmarks through its own
+  # ggp session.
   logging.info('Executing %s benchmarks, storing results in %s',
                len(test_cases), args.out)
-  for tc in test_cases:
-    rc = RunBenchmarkTestCase(tc, args.ggp_bin, args.instance, args.app_path,
-                              args.vars, args.num_frames, args.out)
+  num_workers = min(args.jobs,
+                    len({tc.GetBinaryName() for tc in test_cases}))
+
+  with contextlib.ExitStack() as stack:
+    sessions = queue.SimpleQueue()
+    for _ in range(num_workers):
+      sessions.put(
+          stack.enter_context(
+              ggp_utils.GgpSession(args.ggp_bin, args.instance)))
+
+    # Set on the first failure with --fail_fast. Checked by workers right
+    # before running a benchmark, so that none starts after a failure.
+    stop_running = threading.Event()
+
+    def _Run(tc):
+      """Runs a test case, returns None if it was skipped."""
+      if stop_running.is_set():
+        return None
+      session = sessions.get()
+      try:
+        rc = RunBenchmarkTestCase(tc, args.ggp_bin, args.instance,
+                                  args.app_path, args.vars, args.num_frames,
+                                  session)
+      finally:
+        sessions.put(session)
+      if rc != 0 and args.fail_fast:
+        stop_running.set()
+      return rc
+
+    failed = False
+    completed_test_cases = []
+    with futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+      waiting = list(test_cases)
+      running = {}
+
+      def _SubmitReady():
+        """Fills the free workers with the next test cases that can run."""
+        running_binaries = {tc.GetBinaryName() for tc in running.values()}
+        for tc in list(waiting):
+          if len(running) >= num_workers:
+            break
+          if tc.GetBinaryName() in running_binaries:
+            continue
+          waiting.remove(tc)
+          running[executor.submit(_Run, tc)] = tc
+          running_binaries.add(tc.GetBinaryName())
+
+      _SubmitReady()
+      while running:
+        done, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+        for completed_future in done:
+          # Benchmarks still running after a --fail_fast failure are waited
+          # for, and their failures are logged as well.
+          tc = running.pop(completed_future)
+          rc = completed_future.result()
+          if rc is None:
+            continue
+          if rc == 0:
+            completed_test_cases.append(tc)
+            continue
+          logging.error('Benchmark "%s" failed to execute',
+                        tc.GetDescriptiveName())
+          if args.fail_fast and not failed:
+            logging.error('Skipping the remaining benchmarks')
+            waiting.clear()
+          failed = True
+        _SubmitReady()
+
+  # Retrieve the CSV result output of all the benchmarks in a single transfer.
+  # Local copies from earlier runs are removed first, so that results missing
+  # from this transfer can be told apart.
+  if completed_test_cases:
+    local_csv_files = {
+        tc: os.path.join(args.out, tc.GetCsvOutputFilename())
+        for tc in completed_test_cases
+    }
+    for local_csv_file in local_csv_files.values():
+      if os.path.exists(local_csv_file):
+        os.remove(local_csv_file)
+
+    csv_file_paths = [
+        GetRemoteCsvFilePath(tc, args.app_path) for tc in completed_test_cases
+    ]
+    rc = ggp_utils.GetFilesFromInstance(args.ggp_bin, args.instance,
+                                        csv_file_paths, args.out)
     if rc != 0:
-      logging.error(
-          'Benchmark "%s" failed to execute or results are unavailable',
-          tc.GetDescriptiveName)
-
+      missing = [
+          tc for tc, local_csv_file in local_csv_files.items()
+          if not os.path.exists(local_csv_file)
+      ]
+      for tc in missing:
+        logging.error('Benchmark "%s" results are unavailable',
+                      tc.GetDescriptiveName())
+      if len(missing) == len(completed_test_cases):
+        logging.error('Benchmark results could not be retrieved')
+        return rc
+
+  if failed and args.fail_fast:
+    return 1
   return 0
 
 